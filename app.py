@@ -1,16 +1,31 @@
-import os, uuid, json
+import os, uuid, json, io, contextlib, traceback, tempfile, zipfile, threading
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, flash, jsonify
+from flask import Flask, Request, Response, render_template, request, redirect, url_for, send_from_directory, flash, jsonify, abort
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 from flask_cors import CORS
 import pandas as pd
-import subprocess
-import sys
+
+from canopy_pipeline.validator import load_contract, import_treesum
+from canopy_pipeline.stand_aggregator import aggregate
+from canopy_pipeline.owner_report_build_v3plus import build_report_v3plus
 
 # ---------- App init / config ----------
+UPLOAD_SPOOL_MAX = 8 * 1024 * 1024  # uploads up to 8 MB stay in memory until saved
+UPLOAD_BUFFER = 1024 * 1024  # copy buffer when saving uploads to the job dir
+
+class CanopyRequest(Request):
+    # Werkzeug spools file parts to a temp file past 500 KB; raise that so
+    # typical TreeSum uploads are written to disk once, by save()
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX, mode="rb+")
+
 app = Flask(__name__)
+app.request_class = CanopyRequest
 app.secret_key = os.environ.get("SECRET_KEY","dev-secret")
 app.config["MAX_CONTENT_LENGTH"] = 100 * 1024 * 1024  # 100 MB uploads
+# Let a fronting Apache (mod_xsendfile) / lighttpd serve downloads from disk
+app.config["USE_X_SENDFILE"] = bool(int(os.environ.get("USE_X_SENDFILE", "0")))
 CORS(app, resources={r"/api/*": {"origins": [
     "https://app.canopy.yourdomain.com",
     "http://localhost:3000"
@@ -37,16 +52,62 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(OUT_DIR, exist_ok=True)
 
 PIPE_DIR = os.path.join(ROOT, "canopy_pipeline")
-VALIDATOR = os.path.join(PIPE_DIR, "validator.py")
-AGGREGATOR = os.path.join(PIPE_DIR, "stand_aggregator.py")
-REPORTER = os.path.join(PIPE_DIR, "owner_report_build_v3plus.py")
 CONTRACT = os.path.join(PIPE_DIR, "treesum_import_contract.json")
-ALLOWED_EXTS = {"xlsx","xlsm","csv","json"}
+CONTRACT_DATA = load_contract(CONTRACT)
+ALLOWED_EXTS = {"xlsx","xlsm","csv","parquet","json"}
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".",1)[1].lower() in ALLOWED_EXTS
 
+def list_job_files(workdir):
+    # Sorted names of the regular files in a job directory
+    with os.scandir(workdir) as it:
+        return sorted(e.name for e in it if e.is_file())
+
+class ChunkSink:
+    # Write-only file object for ZipFile; collects output until drained
+    def __init__(self):
+        self.chunks = []
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+    def flush(self):
+        pass
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def stream_zip(workdir, names, chunk_size=UPLOAD_BUFFER):
+    # Yield a deflate(level 1) ZIP of the given files as it is written; holds one chunk at a time
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for name in names:
+            with open(os.path.join(workdir, name), "rb") as src, zf.open(name, "w") as dst:
+                for chunk in iter(lambda: src.read(chunk_size), b""):
+                    dst.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+    yield sink.drain()
+
 # ---------- Shared pipeline runner ----------
+# redirect_stdout/stderr swap the process-wide sys.stdout/sys.stderr, so captured
+# stages run one at a time per process (threaded dev server, gunicorn threads=)
+STEP_LOCK = threading.Lock()
+
+def run_step(fn, *args, **kwargs):
+    # Run a pipeline stage in-process, capturing what it prints like the old CLI runs did
+    out, err = io.StringIO(), io.StringIO()
+    ok = True
+    with STEP_LOCK, contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            fn(*args, **kwargs)
+        except Exception:
+            traceback.print_exc()
+            ok = False
+    return ok, out.getvalue(), err.getvalue()
+
 def run_pipeline(req):
     tree_file = req.files.get("treesum")
     prices_file = req.files.get("prices")
@@ -61,68 +122,73 @@ def run_pipeline(req):
     species_col = req.form.get("species_col","CalSpecies").strip() or "CalSpecies"
 
     if not tree_file or not allowed_file(tree_file.filename):
-        return {"error":"Please upload a TreeSum file (.xlsx/.xlsm/.csv)."}
+        return {"error":"Please upload a TreeSum file (.xlsx/.xlsm/.csv/.parquet)."}
     if not prices_file or not allowed_file(prices_file.filename):
         return {"error":"Please upload a prices JSON file."}
     try:
         float(size_value)
     except Exception:
         return {"error":"Plot size (ac) or BAF must be numeric."}
+    try:
+        float(discount)
+    except Exception:
+        return {"error":"Discount rate (%) must be numeric."}
 
     uid = datetime.now().strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:8]
     workdir = os.path.join(OUT_DIR, uid)
     os.makedirs(workdir, exist_ok=True)
 
-    tree_path = os.path.join(workdir, secure_filename(tree_file.filename)); tree_file.save(tree_path)
-    prices_path = os.path.join(workdir, secure_filename(prices_file.filename)); prices_file.save(prices_path)
+    tree_path = os.path.join(workdir, secure_filename(tree_file.filename)); tree_file.save(tree_path, buffer_size=UPLOAD_BUFFER)
+    prices_path = os.path.join(workdir, secure_filename(prices_file.filename)); prices_file.save(prices_path, buffer_size=UPLOAD_BUFFER)
 
     events_path = ""
     if events_file and events_file.filename and allowed_file(events_file.filename):
-        events_path = os.path.join(workdir, secure_filename(events_file.filename)); events_file.save(events_path)
+        events_path = os.path.join(workdir, secure_filename(events_file.filename)); events_file.save(events_path, buffer_size=UPLOAD_BUFFER)
 
     calibration_path = ""
     if calibration_file and calibration_file.filename and allowed_file(calibration_file.filename):
-        calibration_path = os.path.join(workdir, secure_filename(calibration_file.filename)); calibration_file.save(calibration_path)
+        calibration_path = os.path.join(workdir, secure_filename(calibration_file.filename)); calibration_file.save(calibration_path, buffer_size=UPLOAD_BUFFER)
 
     outprefix = os.path.join(workdir, "out")
 
     # Step 1: validate
-    contract_path = CONTRACT
-    run1 = subprocess.run([sys.executable, VALIDATOR, tree_path, contract_path, outprefix], capture_output=True, text=True)
-    if run1.returncode != 0:
-        return {"error":"Validator failed", "stdout":run1.stdout, "stderr":run1.stderr, "job_id":uid}
+    ok1, out1, err1 = run_step(import_treesum, tree_path, CONTRACT_DATA, outprefix)
+    if not ok1:
+        return {"error":"Validator failed", "stdout":out1, "stderr":err1, "job_id":uid}
 
     # Step 2: aggregate
-    size_val = str(float(size_value))
-    agg_args = [sys.executable, AGGREGATOR, f"{outprefix}_canopy_treelevel.csv", outprefix, cruise_type, size_val]
+    size_val = float(size_value)
+    agg_kwargs = {"cruise_type": cruise_type}
+    if cruise_type == "Point":
+        agg_kwargs["baf"] = size_val
+    else:
+        agg_kwargs["plot_size_ac"] = size_val
     if calibration_path:
-        agg_args += ["--calibration", calibration_path, "--species_col", species_col]
-    run2 = subprocess.run(agg_args, capture_output=True, text=True)
-    if run2.returncode != 0:
-        return {"error":"Aggregator failed", "stdout":run2.stdout, "stderr":run2.stderr, "job_id":uid}
+        agg_kwargs.update(calibration_json=calibration_path, species_col=species_col)
+    ok2, out2, err2 = run_step(aggregate, f"{outprefix}_canopy_treelevel.csv", outprefix, **agg_kwargs)
+    if not ok2:
+        return {"error":"Aggregator failed", "stdout":out2, "stderr":err2, "job_id":uid}
 
     # Step 3: report
     report_path = f"{outprefix}_owner_report.html"
-    report_args = [sys.executable, REPORTER, f"{outprefix}_stand_summary.csv", prices_path, report_path]
-    report_args.append(events_path if events_path else "")
-    report_args += [owner, tract, discount]
+    report_kwargs = {"events_csv": events_path or None, "owner_name": owner, "tract_name": tract,
+                     "discount_rate": float(discount)/100.0}
     if calibration_path:
-        report_args += [calibration_path, species_col]
-    run3 = subprocess.run(report_args, capture_output=True, text=True)
-    if run3.returncode != 0:
-        return {"error":"Report builder failed", "stdout":run3.stdout, "stderr":run3.stderr, "job_id":uid}
+        report_kwargs.update(calibration_json=calibration_path, species_col=species_col)
+    ok3, out3, err3 = run_step(build_report_v3plus, f"{outprefix}_stand_summary.csv", prices_path, report_path, **report_kwargs)
+    if not ok3:
+        return {"error":"Report builder failed", "stdout":out3, "stderr":err3, "job_id":uid}
 
-    files = []
-    for fn in os.listdir(workdir):
-        files.append({"name": fn, "url": url_for("download_file", uid=uid, filename=fn)})
+    files = [{"name": fn, "url": url_for("download_file", uid=uid, filename=fn)} for fn in list_job_files(workdir)]
 
     return {
         "error": None,
         "job_id": uid,
         "report_url": url_for("download_file", uid=uid, filename=os.path.basename(report_path)),
-        "files": sorted(files, key=lambda x: x["name"]),
-        "stdout": "\n".join([run1.stdout, run2.stdout, run3.stdout]),
-        "stderr": "\n".join([run1.stderr, run2.stderr, run3.stderr]),
+        "zip_url": url_for("download_zip", uid=uid),
+        "files": files,
+        "stdout": "\n".join([out1, out2, out3]),
+        "stderr": "\n".join([err1, err2, err3]),
     }
 
 # ---------- Routes ----------
@@ -136,12 +202,20 @@ def process():
     if res["error"]:
         return render_template("result.html", error=res["error"], stdout=res.get("stdout",""), stderr=res.get("stderr",""), files=[])
     return render_template("result.html", error=None, stdout=res.get("stdout",""), stderr=res.get("stderr",""),
-                           files=res["files"], report_url=res["report_url"])
+                           files=res["files"], report_url=res["report_url"], zip_url=res["zip_url"])
 
 @app.route("/download/<uid>/<path:filename>")
 def download_file(uid, filename):
     directory = os.path.join(OUT_DIR, uid)
-    return send_from_directory(directory, filename, as_attachment=False)
+    return send_from_directory(directory, filename, as_attachment=False, conditional=True)
+
+@app.route("/download/<uid>/all.zip")
+def download_zip(uid):
+    directory = safe_join(OUT_DIR, uid)
+    if directory is None or not os.path.isdir(directory):
+        abort(404)
+    return Response(stream_zip(directory, list_job_files(directory)), mimetype="application/zip",
+                    headers={"Content-Disposition": f"attachment; filename={uid}.zip"})
 
 @app.post("/api/process")
 def api_process():
@@ -152,6 +226,7 @@ def api_process():
     status = 200 if not res["error"] else 400
     if res.get("report_url"):
         res["report_url"] = request.url_root.rstrip("/") + res["report_url"]
+        res["zip_url"] = request.url_root.rstrip("/") + res["zip_url"]
         for f in res.get("files", []):
             f["url"] = request.url_root.rstrip("/") + f["url"]
     return jsonify(res), status
@@ -1,63 +1,117 @@
 
-import sys, json, pandas as pd, numpy as np, numpy_financial as npf, io, base64, math
-    try:
-        irr = float(npf.irr(series)) * 100.0
-    except Exception:
-        irr = float("nan")
+import sys, os, json, functools, pandas as pd, numpy as np, numpy_financial as npf, io, math
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:  # see validator.py
+    json_loads = json.loads
+
+import matplotlib
+from matplotlib.figure import Figure
+# Set once, not per render: rc_context would swap process-wide rcParams under concurrent builds
+matplotlib.rcParams["svg.fonttype"] = "none"
+from datetime import date
 
-import matplotlib.pyplot as plt
-from datetime import date, datetime
+PRODUCTS = ("pulp","cns","saw","export")
+TON_COLS = [f"{k}_t" for k in PRODUCTS]
+# dtype hints for the CSV reads; columns absent from a file are ignored
+STAND_DTYPES = {"stand_id":"string","acres":"float64","tpa_live":"float64","ba_sqft_ac":"float64","qmd_in":"float64","age":"float64"}
+EVENT_DTYPES = {"event":"string","year":"int64","pulp_t":"float64","cns_t":"float64","saw_t":"float64","export_t":"float64"}
 
-TODAY_YEAR = datetime.today().year
+def fig_to_svg(fig):
+    # Inline SVG markup (no XML prolog); text stays as <text> so the browser's fonts are used
+    buf = io.StringIO()
+    fig.savefig(buf, format='svg', bbox_inches='tight')
+    svg = buf.getvalue()
+    return svg[svg.index("<svg"):]
 
-def fig_to_base64_png(fig):
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', dpi=120, bbox_inches='tight')
-    plt.close(fig)
-    buf.seek(0)
-    return "data:image/png;base64," + base64.b64encode(buf.read()).decode("ascii")
+# Each chart gets its own Figure (no pyplot state), so reports can be built concurrently
+def render_exposure(total_tons):
+    fig = Figure(figsize=(4.5,4.5))
+    ax = fig.add_subplot(111)
+    vals = [total_tons[k] for k in PRODUCTS]
+    ax.pie(vals, labels=["Pulp","CNS","Saw","Export"], autopct="%1.0f%%")
+    ax.set_title("Market Exposure (tons)")
+    return fig_to_svg(fig)
 
-def auto_event_years(age, thin1_age=15, thin2_age=21, final_age=30):
-    if pd.isna(age):
-        return TODAY_YEAR+2, TODAY_YEAR+8, TODAY_YEAR+15
-    y1 = max(TODAY_YEAR, TODAY_YEAR + int(round(thin1_age - age)))
-    y2 = max(y1+1, TODAY_YEAR + int(round(thin2_age - age)))
-    yf = max(y2+1, TODAY_YEAR + int(round(final_age - age)))
-    return y1, y2, yf
+def render_ba(stands):
+    fig = Figure(figsize=(6,3))
+    ax = fig.add_subplot(111)
+    ax.bar(stands["stand_id"].astype(str), stands["ba_sqft_ac"])
+    ax.set_ylabel("BA (ft²/ac)"); ax.set_title("Basal Area by Stand")
+    return fig_to_svg(fig)
+
+def render_timeline(ev_gross):
+    fig = Figure(figsize=(6,3))
+    ax = fig.add_subplot(111)
+    ax.bar(ev_gross["year"].astype(int).astype(str), ev_gross["gross"])
+    ax.set_title("Harvest Timeline (Gross $)"); ax.set_ylabel("USD")
+    return fig_to_svg(fig)
+
+# The helpers below work elementwise on arrays (one entry per stand) as well as scalars
+def auto_event_years(age, thin1_age=15, thin2_age=21, final_age=30, today_year=None):
+    if today_year is None: today_year = date.today().year
+    age = np.asarray(age, dtype=np.float64)
+    known = ~np.isnan(age)
+    a = np.where(known, age, 0.0)
+    y1 = np.maximum(today_year, today_year + np.round(thin1_age - a).astype(np.int64))
+    y2 = np.maximum(y1+1, today_year + np.round(thin2_age - a).astype(np.int64))
+    yf = np.maximum(y2+1, today_year + np.round(final_age - a).astype(np.int64))
+    return np.where(known, y1, today_year+2), np.where(known, y2, today_year+8), np.where(known, yf, today_year+15)
+
+# Product split rows (pulp, cns, saw, export) for QMD < 6, < 8, < 10 and above
+QMD_SPLIT_EDGES = [6, 8, 10]
+QMD_SPLITS = np.array([[0.9,0.1,0.0,0.0],
+                       [0.5,0.4,0.1,0.0],
+                       [0.3,0.4,0.3,0.0],
+                       [0.2,0.3,0.4,0.1]])
 
 def product_split_from_qmd(qmd):
-    if pd.isna(qmd): qmd = 7.0
-    if qmd < 6: return {"pulp":0.9,"cns":0.1,"saw":0.0,"export":0.0}
-    if qmd < 8: return {"pulp":0.5,"cns":0.4,"saw":0.1,"export":0.0}
-    if qmd < 10: return {"pulp":0.3,"cns":0.4,"saw":0.3,"export":0.0}
-    return {"pulp":0.2,"cns":0.3,"saw":0.4,"export":0.1}
+    qmd = np.nan_to_num(np.asarray(qmd, dtype=np.float64), nan=7.0)
+    split = QMD_SPLITS[np.searchsorted(QMD_SPLIT_EDGES, qmd, side="right")]
+    return {k: split[..., i] for i, k in enumerate(PRODUCTS)}
 
 def estimate_tons(ba, acres, event_type, removal_pct=0.28, yield_per_ba=0.12, final_tons_bounds=(60,150)):
-    if pd.isna(ba) or pd.isna(acres) or acres<=0:
-        return 0.0
+    ba = np.asarray(ba, dtype=np.float64)
+    acres = np.asarray(acres, dtype=np.float64)
     if event_type in ("first_thin","second_thin"):
-        t = float(ba) * float(removal_pct) * float(yield_per_ba) * float(acres)
-        return max(t, 0.0)
-    tons_per_ac = max(final_tons_bounds[0], min(final_tons_bounds[1], float(ba) * 1.2))
-    return tons_per_ac * float(acres)
-
-def allocate_products(total_tons, split):
-    return {
-        "pulp_t": total_tons * split["pulp"],
-        "cns_t": total_tons * split["cns"],
-        "saw_t": total_tons * split["saw"],
-        "export_t": total_tons * split["export"],
-    }
+        t = np.maximum(ba * removal_pct * yield_per_ba * acres, 0.0)
+    else:
+        t = np.clip(ba * 1.2, final_tons_bounds[0], final_tons_bounds[1]) * acres
+    return np.where(~np.isnan(ba) & (acres > 0), t, 0.0)
+
+# Parsed JSON is cached per (path, mtime); callers share the result and must not mutate it
+@functools.lru_cache(maxsize=64)
+def _read_calibration(path, mtime_ns):
+    with open(path, "rb") as f:
+        return json_loads(f.read())
 
 def load_calibration(path):
     if not path:
         return {}
     try:
-        with open(path) as f:
-            return json.load(f)
+        return _read_calibration(path, os.stat(path).st_mtime_ns)
     except Exception:
         return {}
 
+@functools.lru_cache(maxsize=64)
+def _read_prices(path, mtime_ns):
+    with open(path, "rb") as f: raw_prices = json_loads(f.read())
+    prices = {"pulp": raw_prices.get("pulp", 0), "cns": raw_prices.get("cns", 0), "saw": raw_prices.get("saw", 0), "export": raw_prices.get("export", 0)}
+    costs = {
+        "logging_per_ton_pulp": raw_prices.get("logging_cost_per_ton_pulp", 0),
+        "logging_per_ton_cns": raw_prices.get("logging_cost_per_ton_cns", 0),
+        "logging_per_ton_saw": raw_prices.get("logging_cost_per_ton_saw", 0),
+        "logging_per_ton_export": raw_prices.get("logging_cost_per_ton_export", 0),
+        "trucking_per_ton": raw_prices.get("trucking_rate_per_ton", 0),
+        "consulting_pct": raw_prices.get("consulting_fee_pct", 0),
+    }
+    return prices, costs
+
+def load_prices(path):
+    # Returns (prices, costs) dicts parsed from prices.json
+    return _read_prices(path, os.stat(path).st_mtime_ns)
+
 def get_factor(factors, group, name):
     if isinstance(factors, dict):
         if group in factors and name in factors[group]:
@@ -66,27 +120,34 @@ def get_factor(factors, group, name):
             return float(factors["ALL"][name])
     return 1.0
 
-def compute_cashflows(events_df, prices, costs=None, discount_rate=0.05):
+def col_values(df, col):
+    return df[col].tolist() if col in df.columns else [np.nan]*len(df)
+
+def col_array(df, col):
+    return df[col].to_numpy(dtype=np.float64) if col in df.columns else np.full(len(df), np.nan)
+
+def product_rates(prices, costs=None):
+    # (products x 3) per-ton rates: price, logging cost, trucking cost; rows in PRODUCTS order
+    if costs is None: costs = {}
+    return np.array([[prices.get(k,0.0), costs.get(f"logging_per_ton_{k}", 0.0), costs.get("trucking_per_ton", 0.0)]
+                     for k in PRODUCTS], dtype=np.float64)
+
+def compute_cashflows(events_df, prices, costs=None, discount_rate=0.05, today_year=None):
     if costs is None: costs = {}
-    cf = []
-    for _,r in events_df.iterrows():
-        year = int(r["year"])
-        tons = {"pulp":r["pulp_t"], "cns":r["cns_t"], "saw":r["saw_t"], "export":r["export_t"]}
-        gross = sum(tons[k]*prices.get(k,0.0) for k in tons.keys())
-        logging = sum(tons[k]*costs.get(f"logging_per_ton_{k}", 0.0) for k in tons.keys())
-        trucking = sum(tons[k]*costs.get("trucking_per_ton", 0.0) for k in tons.keys())
-        consulting = (costs.get("consulting_pct", 0.0)/100.0) * gross
-        net = gross - logging - trucking - consulting
-        years_from_now = max(0, year - date.today().year)
-        cf.append({"year": year, "gross": gross, "net": net, "years_from_now": years_from_now})
-    npv = sum(c["net"] / ((1+discount_rate)**c["years_from_now"]) for c in cf)
-    # IRR support
-    max_h = max([c["years_from_now"] for c in cf]+[0])
-    series = [0.0]*(max_h+1)
-    for c in cf:
-        series[c["years_from_now"]] += c["net"]
+    if today_year is None: today_year = date.today().year
+    tons = events_df[TON_COLS].to_numpy(dtype=np.float64)
+    years = events_df["year"].to_numpy(dtype=np.int64)
+    gross, logging, trucking = (tons @ product_rates(prices, costs)).T
+    consulting = (costs.get("consulting_pct", 0.0)/100.0) * gross
+    net = gross - logging - trucking - consulting
+    years_from_now = np.maximum(0, years - today_year)
+    cf = [{"year": int(y), "gross": float(g), "net": float(n), "years_from_now": int(h)}
+          for y, g, n, h in zip(years, gross, net, years_from_now)]
+    npv = float((net / (1+discount_rate)**years_from_now).sum())
+    # IRR support: net cashflow per year from now
+    series = np.bincount(years_from_now, weights=net, minlength=1)
     try:
-        irr = np.irr(series) * 100.0 if hasattr(np, "irr") else float("nan")
+        irr = float(npf.irr(series)) * 100.0
     except Exception:
         irr = float("nan")
     return cf, npv, irr
@@ -94,23 +155,16 @@ def compute_cashflows(events_df, prices, costs=None, discount_rate=0.05):
 def build_report_v3plus(stand_summary_csv, prices_json, out_html,
                         events_csv=None, owner_name="Owner", tract_name="Tract", discount_rate=0.05,
                         calibration_json=None, species_col=None):
-    stands = pd.read_csv(stand_summary_csv)
-    with open(prices_json) as f: raw_prices = json.load(f)
-    prices = {"pulp": raw_prices.get("pulp", 0), "cns": raw_prices.get("cns", 0), "saw": raw_prices.get("saw", 0), "export": raw_prices.get("export", 0)}
-    costs = {
-        "logging_per_ton_pulp": raw_prices.get("logging_cost_per_ton_pulp", 0),
-        "logging_per_ton_cns": raw_prices.get("logging_cost_per_ton_cns", 0),
-        "logging_per_ton_saw": raw_prices.get("logging_cost_per_ton_saw", 0),
-        "logging_per_ton_export": raw_prices.get("logging_cost_per_ton_export", 0),
-        "trucking_per_ton": raw_prices.get("trucking_rate_per_ton", 0),
-        "consulting_pct": raw_prices.get("consulting_fee_pct", 0),
-    }
+    # Read the date per build (not at import) so long-lived workers roll over with the calendar
+    today = date.today()
+    stands = pd.read_csv(stand_summary_csv, engine="pyarrow", dtype=STAND_DTYPES)
+    prices, costs = load_prices(prices_json)
 
     cal = load_calibration(calibration_json)
 
     # Build/Load events
     if events_csv:
-        events = pd.read_csv(events_csv)
+        events = pd.read_csv(events_csv, engine="pyarrow", dtype=EVENT_DTYPES)
         # Apply ONLY global product factors if available (no stand/species info here)
         for k in ["pulp","cns","saw","export"]:
             fac = get_factor(cal, "ALL", f"{k}_factor")
@@ -118,57 +172,42 @@ def build_report_v3plus(stand_summary_csv, prices_json, out_html,
             if col in events.columns:
                 events[col] = events[col] * fac
     else:
-        rows = []
-        for _,r in stands.iterrows():
-            sid = r["stand_id"]
-            acres = r.get("acres", np.nan)
-            ba = r.get("ba_sqft_ac", np.nan)
-            qmd = r.get("qmd_in", np.nan)
-            age = r.get("age", np.nan) if "age" in stands.columns else np.nan
-            group = r.get(species_col, "ALL") if (species_col and species_col in r.index) else "ALL"
-            y1, y2, yf = auto_event_years(age)
-            split = product_split_from_qmd(qmd)
-            # Estimate tons per event
-            t1 = estimate_tons(ba, acres, "first_thin", removal_pct=0.28)
-            t2 = estimate_tons(ba, acres, "second_thin", removal_pct=0.33)
-            tf = estimate_tons(ba, acres, "final")
-            for (evt, yr, t) in [("first_thin", y1, t1), ("second_thin", y2, t2), ("final", yf, tf)]:
-                alloc = allocate_products(t, split)
-                # Apply per-group product scaling factors
-                for k in ["pulp","cns","saw","export"]:
-                    alloc[f"{k}_t"] *= get_factor(cal, group, f"{k}_factor")
-                row = {"stand_id": sid, "event": evt, "year": yr, "group": group}
-                row.update(alloc)
-                rows.append(row)
-        events = pd.DataFrame(rows)
-        # Aggregate to tract totals by event-year for charts
-        events = events.groupby(["event","year"], as_index=False)[["pulp_t","cns_t","saw_t","export_t"]].sum()
+        acres, ba = col_array(stands, "acres"), col_array(stands, "ba_sqft_ac")
+        y1, y2, yf = auto_event_years(col_array(stands, "age"), today_year=today.year)
+        split = product_split_from_qmd(col_array(stands, "qmd_in"))
+        # Estimate tons per event, one row per event and stand column
+        tons = np.stack([estimate_tons(ba, acres, "first_thin", removal_pct=0.28),
+                         estimate_tons(ba, acres, "second_thin", removal_pct=0.33),
+                         estimate_tons(ba, acres, "final")])
+        # Per-group product scaling factors, resolved once per distinct group
+        if species_col and species_col in stands.columns:
+            codes, groups = pd.factorize(stands[species_col].fillna("ALL"))
+        else:
+            codes, groups = np.zeros(len(stands), dtype=np.intp), ["ALL"]
+        factors = np.array([[get_factor(cal, g, f"{k}_factor") for k in PRODUCTS] for g in groups]).reshape(-1, len(PRODUCTS))
+        alloc = tons[:, :, None] * np.stack([split[k] for k in PRODUCTS], axis=-1) * factors[codes]
+        # Aggregate to tract totals by event-year for charts, sorted by event then year
+        keys, totals = [], []
+        for evt, yrs, t in sorted(zip(["first_thin", "second_thin", "final"], (y1, y2, yf), alloc), key=lambda e: e[0]):
+            uniq, inv = np.unique(yrs, return_inverse=True)
+            acc = np.zeros((len(uniq), len(PRODUCTS)))
+            np.add.at(acc, inv, t)
+            keys += [(evt, int(y)) for y in uniq]
+            totals.append(acc)
+        events = pd.DataFrame(keys, columns=["event", "year"]).join(pd.DataFrame(np.concatenate(totals), columns=TON_COLS))
 
     # Charts
     total_tons = {k: float(events[f"{k}_t"].sum()) for k in ["pulp","cns","saw","export"]}
-    fig_exposure = plt.figure(figsize=(4.5,4.5))
-    vals = [total_tons[k] for k in ["pulp","cns","saw","export"]]
-    plt.pie(vals, labels=["Pulp","CNS","Saw","Export"], autopct="%1.0f%%")
-    plt.title("Market Exposure (tons)")
-    chart_exposure = fig_to_base64_png(fig_exposure)
-
-    fig_ba = plt.figure(figsize=(6,3))
-    plt.bar(stands["stand_id"].astype(str), stands["ba_sqft_ac"])
-    plt.ylabel("BA (ft²/ac)"); plt.title("Basal Area by Stand")
-    chart_ba = fig_to_base64_png(fig_ba)
-
-    ev_gross = events.assign(gross = events["pulp_t"]*prices["pulp"] + events["cns_t"]*prices["cns"] + events["saw_t"]*prices["saw"] + events["export_t"]*prices["export"])
-    fig_tl = plt.figure(figsize=(6,3))
-    plt.bar(ev_gross["year"].astype(int).astype(str), ev_gross["gross"])
-    plt.title("Harvest Timeline (Gross $)"); plt.ylabel("USD")
-    chart_timeline = fig_to_base64_png(fig_tl)
+    ev_gross = events.assign(gross = events[TON_COLS].to_numpy(dtype=np.float64) @ product_rates(prices)[:, 0])
+    chart_exposure = render_exposure(total_tons)
+    chart_ba = render_ba(stands)
+    chart_timeline = render_timeline(ev_gross)
 
     # ROI
-    cashflows, npv, irr = compute_cashflows(ev_gross, prices, costs=costs, discount_rate=discount_rate)
+    cashflows, npv, irr = compute_cashflows(ev_gross, prices, costs=costs, discount_rate=discount_rate, today_year=today.year)
 
     # HTML
-    today = str(date.today())
-    html = f"""<!doctype html>
+    parts = [f"""<!doctype html>
 <html>
 <head>
   <meta charset="utf-8"/>
@@ -182,7 +221,8 @@ def build_report_v3plus(stand_summary_csv, prices_json, out_html,
     th {{ background:#f7f7f7; text-align:left; }}
     .grid {{ display: grid; grid-template-columns: repeat(2, 1fr); gap: 16px; }}
     .card {{ border:1px solid #eee; border-radius: 10px; padding: 12px; background: #fff; }}
-    img.chart {{ max-width: 100%; height: auto; border:1px solid #eee; border-radius: 6px; padding: 4px; background: #fff; }}
+    .chart {{ border:1px solid #eee; border-radius: 6px; padding: 4px; background: #fff; }}
+    .chart svg {{ display: block; max-width: 100%; height: auto; }}
     .small {{ font-size: 12px; color:#666; }}
   </style>
 </head>
@@ -200,33 +240,32 @@ def build_report_v3plus(stand_summary_csv, prices_json, out_html,
   <h2>Stand Summary</h2>
   <table>
     <tr><th>Stand</th><th>Acres</th><th>TPA</th><th>BA (ft²/ac)</th><th>QMD (in)</th></tr>
-  """
-    for _,r in stands.iterrows():
-        acres = r["acres"] if "acres" in r and not pd.isna(r["acres"]) else ""
-        tpa = r["tpa_live"] if "tpa_live" in r else np.nan
-        ba = r["ba_sqft_ac"] if "ba_sqft_ac" in r else np.nan
-        qmd = r["qmd_in"] if "qmd_in" in r else np.nan
-        html += f"<tr><td>{r['stand_id']}</td><td>{acres}</td><td>{tpa:.1f}</td><td>{ba:.1f}</td><td>{qmd:.1f}</td></tr>"
-    html += "</table>"
-
-    html += f"<h2>Charts</h2><div class='grid'><div class='card'><strong>Basal Area by Stand</strong><br/><img class='chart' src='{chart_ba}'/></div>"
-    html += f"<div class='card'><strong>Market Exposure (tons)</strong><br/><img class='chart' src='{chart_exposure}'/></div></div>"
-    html += f"<div class='card' style='margin-top:16px;'><strong>Harvest Timeline (Gross $)</strong><br/><img class='chart' src='{chart_timeline}'/></div>"
-
-    html += "<h2>Event Schedule (Totals)</h2><table><tr><th>Event</th><th>Year</th><th>Pulp (t)</th><th>CNS (t)</th><th>Saw (t)</th><th>Export (t)</th><th>Gross ($)</th></tr>"
-    for _,e in ev_gross.iterrows():
-        html += f"<tr><td>{e['event']}</td><td>{int(e['year'])}</td><td>{e['pulp_t']:,.0f}</td><td>{e['cns_t']:,.0f}</td><td>{e['saw_t']:,.0f}</td><td>{e['export_t']:,.0f}</td><td>${e['gross']:,.0f}</td></tr>"
-    html += "</table>"
-
-    html += "<h2>Assumptions</h2><ul>"
-    html += "<li>Thin1 ~28% BA, Thin2 ~33% BA; Final at target rotation ~30 (auto if ages unknown).</li>"
-    html += "<li>Product splits estimated from QMD; override by supplying events.csv with product tons.</li>"
-    html += "<li>Calibration product factors applied per species (auto-events) or global factors (provided totals).</li>"
-    html += "<li>Costs from prices.json (logging/trucking/consulting) if provided; otherwise $0.</li>"
-    html += "<li>Estimation factors are placeholders; run calibration helper to align with your gold standard.</li>"
-    html += "</ul>"
-
-    html += "</body></html>"
+  """]
+    for sid, acres, tpa, ba, qmd in zip(stands["stand_id"].tolist(), col_values(stands, "acres"), col_values(stands, "tpa_live"),
+                                        col_values(stands, "ba_sqft_ac"), col_values(stands, "qmd_in")):
+        acres = "" if pd.isna(acres) else acres
+        parts.append(f"<tr><td>{sid}</td><td>{acres}</td><td>{tpa:.1f}</td><td>{ba:.1f}</td><td>{qmd:.1f}</td></tr>")
+    parts.append("</table>")
+
+    parts.append(f"<h2>Charts</h2><div class='grid'><div class='card'><strong>Basal Area by Stand</strong><br/><div class='chart'>{chart_ba}</div></div>")
+    parts.append(f"<div class='card'><strong>Market Exposure (tons)</strong><br/><div class='chart'>{chart_exposure}</div></div></div>")
+    parts.append(f"<div class='card' style='margin-top:16px;'><strong>Harvest Timeline (Gross $)</strong><br/><div class='chart'>{chart_timeline}</div></div>")
+
+    parts.append("<h2>Event Schedule (Totals)</h2><table><tr><th>Event</th><th>Year</th><th>Pulp (t)</th><th>CNS (t)</th><th>Saw (t)</th><th>Export (t)</th><th>Gross ($)</th></tr>")
+    for evt, yr, pulp, cns, saw, export, gross in zip(*(ev_gross[c].tolist() for c in ["event","year","pulp_t","cns_t","saw_t","export_t","gross"])):
+        parts.append(f"<tr><td>{evt}</td><td>{int(yr)}</td><td>{pulp:,.0f}</td><td>{cns:,.0f}</td><td>{saw:,.0f}</td><td>{export:,.0f}</td><td>${gross:,.0f}</td></tr>")
+    parts.append("</table>")
+
+    parts.append("<h2>Assumptions</h2><ul>")
+    parts.append("<li>Thin1 ~28% BA, Thin2 ~33% BA; Final at target rotation ~30 (auto if ages unknown).</li>")
+    parts.append("<li>Product splits estimated from QMD; override by supplying events.csv with product tons.</li>")
+    parts.append("<li>Calibration product factors applied per species (auto-events) or global factors (provided totals).</li>")
+    parts.append("<li>Costs from prices.json (logging/trucking/consulting) if provided; otherwise $0.</li>")
+    parts.append("<li>Estimation factors are placeholders; run calibration helper to align with your gold standard.</li>")
+    parts.append("</ul>")
+
+    parts.append("</body></html>")
+    html = "".join(parts)
     with open(out_html,"w",encoding="utf-8") as f:
         f.write(html)
     print(f"Saved {out_html}")
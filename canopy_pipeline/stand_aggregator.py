@@ -1,11 +1,21 @@
 
-import sys, json, pandas as pd, numpy as np
+import sys, os, json, functools, pandas as pd, numpy as np
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:  # see validator.py
+    json_loads = json.loads
+
+# Cached like the report builder's JSON loaders (see owner_report_build_v3plus.py)
+@functools.lru_cache(maxsize=64)
+def _read_calibration(cal_path, mtime_ns):
+    with open(cal_path, "rb") as f:
+        return json_loads(f.read())
 
 def load_calibration(cal_path):
     if not cal_path:
         return {}
-    with open(cal_path) as f:
-        return json.load(f)
+    return _read_calibration(cal_path, os.stat(cal_path).st_mtime_ns)
 
 def get_factor(factors, group, name):
     # factors: {"ALL": {"ba_factor":1.0,...}, "LP": {...}}
@@ -22,50 +32,62 @@ def aggregate(tree_csv, outprefix, cruise_type="Plot", plot_size_ac=None, baf=No
     if "stand_id" not in df.columns:
         raise ValueError("Missing stand_id column")
     factors = load_calibration(calibration_json)
-    results = []
-    grouped = df.groupby("stand_id")
-    for sid, g in grouped:
-        acres = g["acres"].iloc[0] if "acres" in g.columns and not pd.isna(g["acres"].iloc[0]) else np.nan
-        # Choose group key for calibration
-        if species_col and species_col in g.columns and pd.notna(g[species_col]).any():
-            grp_key = str(g[species_col].dropna().iloc[0])
-        else:
-            grp_key = "ALL"
-        # Count trees
-        n_trees = len(g)
-        # Expansion factor: Plot vs Point
-        if cruise_type=="Plot":
-            if not plot_size_ac:
-                raise ValueError("Need plot_size_ac for Plot cruises")
-            exp_factor = 1.0/plot_size_ac
-            tpa = n_trees * exp_factor
-            ba = (np.pi*(g["dbh_in"]**2)/144.0).sum() * exp_factor
-        elif cruise_type=="Point":
-            if not baf:
-                raise ValueError("Need BAF for Point cruises")
-            # Each tree represents BAF/BA_t of TPA
-            tpa = (baf / (0.005454*g["dbh_in"]**2)).sum()
-            ba = baf * n_trees
-        else:
-            raise ValueError("CruiseType must be Plot or Point")
-        # QMD pre-calibration
-        qmd = np.sqrt((ba*144.0)/(0.005454*len(g))) if len(g)>0 else np.nan
+    # Expansion factor: Plot vs Point
+    if cruise_type=="Plot":
+        if not plot_size_ac:
+            raise ValueError("Need plot_size_ac for Plot cruises")
+    elif cruise_type=="Point":
+        if not baf:
+            raise ValueError("Need BAF for Point cruises")
+    else:
+        raise ValueError("CruiseType must be Plot or Point")
+
+    # Per-tree terms computed once over the whole frame, then summed per stand
+    dbh2 = df["dbh_in"].to_numpy(dtype=np.float64)**2
+    df["_ba_tree"] = np.pi*dbh2/144.0
+    aggs = {"trees_observed": ("dbh_in", "size"), "ba_raw": ("_ba_tree", "sum")}
+    if cruise_type=="Point":
+        # Each tree represents BAF/BA_t of TPA
+        df["_tpa_tree"] = baf/(0.005454*dbh2)
+        aggs["tpa_raw"] = ("_tpa_tree", "sum")
+    use_species = bool(species_col) and species_col in df.columns
+    if use_species:
+        aggs["grp"] = (species_col, "first")
+    out = df.groupby("stand_id").agg(**aggs)
+    # Acres come from each stand's first row, as recorded
+    if "acres" in df.columns:
+        out.insert(0, "acres", df.drop_duplicates("stand_id").set_index("stand_id")["acres"])
+    else:
+        out.insert(0, "acres", np.nan)
+
+    n_trees = out["trees_observed"]
+    if cruise_type=="Plot":
+        exp_factor = 1.0/plot_size_ac
+        tpa = n_trees * exp_factor
+        ba = out["ba_raw"] * exp_factor
+    else:
+        tpa = out["tpa_raw"]
+        ba = baf * n_trees.astype(np.float64)
+    # QMD pre-calibration
+    qmd = np.sqrt((ba*144.0)/(0.005454*n_trees))
 
-        # Apply calibration factors (if provided)
-        ba *= get_factor(factors, grp_key, "ba_factor")
-        qmd *= get_factor(factors, grp_key, "qmd_factor")
-        tpa *= get_factor(factors, grp_key, "tpa_factor")
+    # Choose group key for calibration, then apply factors (if provided) per group
+    grp = out["grp"].map(str, na_action="ignore").fillna("ALL") if use_species else pd.Series("ALL", index=out.index)
+    groups = grp.unique()
+    fac = {name: grp.map({g: get_factor(factors, g, name) for g in groups})
+           for name in ("ba_factor", "qmd_factor", "tpa_factor")}
+    ba = ba * fac["ba_factor"]
+    qmd = qmd * fac["qmd_factor"]
+    tpa = tpa * fac["tpa_factor"]
 
-        results.append({
-            "stand_id": sid,
-            "acres": acres,
-            "trees_observed": n_trees,
-            "tpa_live": tpa,
-            "ba_sqft_ac": ba,
-            "qmd_in": qmd,
-            "calibration_group": grp_key
-        })
-    out = pd.DataFrame(results)
+    out = pd.DataFrame({
+        "acres": out["acres"],
+        "trees_observed": n_trees,
+        "tpa_live": tpa,
+        "ba_sqft_ac": ba,
+        "qmd_in": qmd,
+        "calibration_group": grp
+    }).reset_index()
     out_csv = f"{outprefix}_stand_summary.csv"
     out.to_csv(out_csv, index=False)
     print(f"Saved stand summary: {out_csv}")
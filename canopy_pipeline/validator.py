@@ -1,89 +1,245 @@
 
-import sys, json, pandas as pd, numpy as np
+import sys, os, json, datetime, pandas as pd, numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa, pyarrow.compute as pc, pyarrow.csv as pacsv, pyarrow.parquet as pq
+# orjson is optional; json.loads takes the same bytes input. The pipeline scripts must
+# each run standalone, so the other two repeat this shim on purpose instead of importing it.
+try:
+    import orjson
+    json_loads = orjson.loads
+    def json_dumps_indent(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    json_loads = json.loads
+    def json_dumps_indent(obj):
+        return json.dumps(obj, indent=2).encode("utf-8")
 
 def load_contract(path):
-    with open(path) as f: return json.load(f)
+    with open(path, "rb") as f: return json_loads(f.read())
+
+def contract_columns(contract):
+    # Every TreeSum column the contract knows about (required, recommended or mapped)
+    return (set(contract.get("required_columns", [])) | set(contract.get("recommended_columns", []))
+            | set(contract.get("mapping_to_canopy", {}).values()))
+
+# Input layouts tried, in order, against the first CruiseDate value
+DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%Y/%m/%d", "%m-%d-%Y", "%d-%b-%Y", "%Y-%m-%d %H:%M:%S"]
+
+def sniff_date_format(s):
+    first = s.dropna()
+    if first.empty:
+        return None
+    first = first.iloc[0]
+    if not isinstance(first, str):  # already datetimes (e.g. Excel cells)
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            datetime.datetime.strptime(first, fmt)
+            return fmt
+        except ValueError:
+            continue
+    return None
+
+def date_output_format(contract):
+    return contract["normalization"].get("dates", {}).get("CruiseDate", "%Y-%m-%d")
 
 def normalize(df, contract):
-    df = df.copy()
+    # Works on df itself: transformed columns are replaced by assignment (the
+    # original buffers are not written to) and the same frame is returned
+    norm = contract["normalization"]
+    if not (norm.get("strip_whitespace") or norm.get("upper_species_codes") or norm.get("downcast_numeric")
+            or "CruiseDate" in df.columns):
+        return df  # nothing to do
     # Trim whitespace
-    if contract["normalization"].get("strip_whitespace", False):
-        for c in df.columns:
-            if df[c].dtype == object:
-                df[c] = df[c].astype(str).str.strip()
+    # (Arrow-backed strings: strip runs as one utf8_trim_whitespace kernel per column, missing stays missing)
+    if norm.get("strip_whitespace", False):
+        for c in df.select_dtypes(include=["object", "string"]).columns:
+            df[c] = df[c].astype("string[pyarrow]").str.strip()
     # Uppercase species
-    if contract["normalization"].get("upper_species_codes", False) and "Species" in df.columns:
-        df["Species"] = df["Species"].astype(str).str.upper()
-    # Standardize dates (best-effort)
+    if norm.get("upper_species_codes", False) and "Species" in df.columns:
+        # Species codes are ASCII: ascii_upper works on the UTF-8 buffer directly
+        sp = pa.array(df["Species"].astype("string[pyarrow]"))
+        df["Species"] = pd.Series(pd.arrays.ArrowStringArray(pc.ascii_upper(sp)), index=df.index)
+    # Optional float32 storage for the contract's "number" columns (halves memory and
+    # scan bandwidth; off by default since it also rounds what the CSVs carry)
+    if norm.get("downcast_numeric", False):
+        for c, t in contract.get("column_types", {}).items():
+            if t == "number" and c in df.columns:
+                df[c] = pd.to_numeric(df[c], errors="coerce", downcast="float")
+    # Standardize dates (best-effort); parsed with one fixed format and kept as
+    # datetime64, the contract's output format is applied when the CSVs are written
     if "CruiseDate" in df.columns:
-        df["CruiseDate"] = pd.to_datetime(df["CruiseDate"], errors="coerce").dt.strftime("%Y-%m-%d")
+        fmt = norm.get("date_format") or sniff_date_format(df["CruiseDate"])
+        df["CruiseDate"] = pd.to_datetime(df["CruiseDate"], format=fmt, errors="coerce", cache=True)
     return df
 
+def num_array(col):
+    # Float view of a numeric column (None if absent); NaN never satisfies a
+    # comparison, so the range checks below need no dropna() copy
+    if col is None:
+        return None
+    col = pd.to_numeric(col, errors="coerce")
+    dtype = np.float32 if col.dtype == np.float32 else np.float64  # keep downcast columns narrow
+    return col.to_numpy(dtype=dtype, na_value=np.nan)
+
+def out_of_range(v, lo, hi):
+    # No union mask is built; the upper bound is only scanned when the lower one passes
+    return bool(np.any(v < lo) or np.any(v > hi))
+
+def constraint_flags(acres, dbh, topdib, defect):
+    # (StandAcres <= 0, DBH outside 1-60, TopDIB > DBH, Defect outside 0-100); None = column absent
+    return (acres is not None and bool(np.any(acres <= 0)),
+            dbh is not None and out_of_range(dbh, 1, 60),
+            topdib is not None and dbh is not None and bool(np.any(topdib > dbh)),
+            defect is not None and out_of_range(defect, 0, 100))
+
+def outside_categories(s, allowed):
+    # Values (and missing cells) outside `allowed` get code -1; that is an int8 scan, no string set lookups
+    return bool((pd.Categorical(s, categories=allowed).codes == -1).any())
+
 def validate(df, contract):
     errors, warnings = [], []
     cols = set(df.columns)
     for req in contract["required_columns"]:
         if req not in cols:
             errors.append(f"Missing required column: {req}")
-    # Constraints (best-effort)
-    if "StandAcres" in cols and (df["StandAcres"].dropna() <= 0).any():
+    # Constraints (best-effort); each column is looked up once and numeric ones are pulled into numpy once
+    get = df.get
+    acres, dbh, topdib, defect = (num_array(get(c)) for c in ("StandAcres", "DBH", "TopDIB", "Defect"))
+    ctype, species = get("CruiseType"), get("Species")
+    bad_acres, bad_dbh, bad_top, bad_def = constraint_flags(acres, dbh, topdib, defect)
+    if bad_acres:
         errors.append("StandAcres must be > 0")
-    if "DBH" in cols:
-        bad_dbh = df["DBH"].dropna()
-        if ((bad_dbh < 1) | (bad_dbh > 60)).any():
-            warnings.append("Some DBH values are outside 1–60 inches")
-    if "TopDIB" in cols and "DBH" in cols:
-        mask = (df["TopDIB"].notna()) & (df["DBH"].notna()) & (df["TopDIB"] > df["DBH"])
-        if mask.any():
-            warnings.append("Some TopDIB > DBH rows found")
-    if "Defect" in cols:
-        bad_def = df["Defect"].dropna()
-        if ((bad_def < 0) | (bad_def > 100)).any():
-            warnings.append("Some Defect values outside 0–100%")
-    if "CruiseType" in cols:
-        bad = ~df["CruiseType"].astype(str).isin(["Plot","Point"])
-        if bad.any():
-            warnings.append("CruiseType contains values other than 'Plot' or 'Point'")
+    if bad_dbh:
+        warnings.append("Some DBH values are outside 1–60 inches")
+    if bad_top:
+        warnings.append("Some TopDIB > DBH rows found")
+    if bad_def:
+        warnings.append("Some Defect values outside 0–100%")
+    if ctype is not None and outside_categories(ctype, ["Plot","Point"]):
+        warnings.append("CruiseType contains values other than 'Plot' or 'Point'")
+    if species is not None and contract.get("allowed_species") and outside_categories(species.dropna(), contract["allowed_species"]):
+        warnings.append("Species contains codes not in the contract's allowed_species")
     return errors, warnings
 
 def remap(df, contract):
-    out = pd.DataFrame()
+    # One reindex by source name (absent sources come back as NaN columns), then relabel
     m = contract["mapping_to_canopy"]
-    for dst, src in m.items():
-        out[dst] = df[src] if src in df.columns else np.nan
+    out = df.reindex(columns=list(m.values()))
+    out.columns = list(m)
     return out
 
-def main():
-    if len(sys.argv) < 4:
-        print("Usage: python validator.py <TreeSum.xlsx|.csv> <contract.json> <output_prefix>")
-        sys.exit(1)
-    infile, contract_path, outprefix = sys.argv[1], sys.argv[2], sys.argv[3]
-    contract = load_contract(contract_path)
-    # Load tree-level data (TreeSum sheet if Excel)
-    if infile.lower().endswith((".xlsx",".xlsm",".xls")):
-        df = pd.read_excel(infile, sheet_name="TreeSum")
-    else:
-        df = pd.read_csv(infile)
+MAX_STANDS_REPORTED = 10000
+
+def stand_ids(col):
+    # Hash-unique in C, then one numpy unicode sort (same order as sorting the str() values)
+    return np.sort(np.asarray(pd.unique(col.dropna()), dtype=str)).tolist()
+
+def arrow_table(df, date_fmt):
+    # One Arrow table for both outputs; datetimes are formatted with the contract's date format
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            table = table.set_column(i, field.name, pc.strftime(table.column(i), format=date_fmt))
+    return table
+
+def canopy_table(table, contract):
+    # Arrow counterpart of remap(): the same column buffers under Canopy names, nulls for absent sources
+    m = contract["mapping_to_canopy"]
+    names = set(table.column_names)
+    cols = [table.column(src) if src in names else pa.nulls(table.num_rows) for src in m.values()]
+    return pa.Table.from_arrays(cols, names=list(m))
+
+def write_table(table, path):
+    pacsv.write_csv(table, path, write_options=pacsv.WriteOptions(include_header=True, quoting_style="needed"))
+
+def as_arrow_strings(df):
+    # Text columns move to Arrow-backed strings once, right after load, so every later
+    # .str call, membership check and the Arrow CSV writer work on UTF-8 buffers
+    obj_cols = df.select_dtypes(include="object").columns.tolist()
+    if obj_cols:
+        df[obj_cols] = df[obj_cols].astype("string[pyarrow]")
+    return df
+
+# Loaders take (path, usecols) where usecols is a column-name predicate or None (all columns)
+def load_excel(infile, usecols):
+    # TreeSum sheet; Rust calamine reader when python-calamine is installed, pandas' default engine otherwise
+    try:
+        return pd.read_excel(infile, sheet_name="TreeSum", engine="calamine", usecols=usecols)
+    except ImportError:
+        return pd.read_excel(infile, sheet_name="TreeSum", usecols=usecols)
+
+def load_csv(infile, usecols):
+    return pd.read_csv(infile, usecols=usecols)
+
+def load_parquet(infile, usecols):
+    # Columnar: only the wanted columns are read from disk
+    names = pq.read_schema(infile).names
+    return pd.read_parquet(infile, columns=[c for c in names if usecols(c)] if usecols else None)
+
+LOADERS = {".xlsx": load_excel, ".xlsm": load_excel, ".xls": load_excel, ".parquet": load_parquet}
+
+def import_treesum(infile, contract, outprefix):
+    # Load tree-level data (TreeSum sheet if Excel, CSV for unknown extensions); only the contract's columns are parsed
+    needed = contract_columns(contract)
+    ignored = {}  # header names the loader skipped, in file order (dict as an ordered set)
+    def usecols(c):
+        if c in needed:
+            return True
+        ignored[str(c)] = None
+        return False
+    if not needed:
+        usecols = None
+    loader = LOADERS.get(os.path.splitext(infile)[1].lower(), load_csv)
+    df = as_arrow_strings(loader(infile, usecols))
     df = normalize(df, contract)
     errors, warnings = validate(df, contract)
     report = {
         "rows": int(len(df)),
         "columns": list(df.columns),
+        "ignored_columns": list(ignored),
         "errors": errors,
         "warnings": warnings,
-        "stands_detected": sorted([str(s) for s in df["StandID"].dropna().unique()]) if "StandID" in df.columns else []
     }
+    # Stand listing is optional (contract "report" section) and capped to keep the JSON bounded
+    report_opts = contract.get("report", {})
+    if report_opts.get("include_stands", True):
+        stands = stand_ids(df["StandID"]) if "StandID" in df.columns else []
+        cap = report_opts.get("max_stands", MAX_STANDS_REPORTED)
+        report["stands_detected"] = stands[:cap]
+        if len(stands) > cap:
+            report["stands_truncated"] = True
     out_csv = f"{outprefix}_treesum_normalized.csv"
     out_json = f"{outprefix}_import_report.json"
-    # Save normalized TreeSum (original columns) and remapped Canopy version
-    df.to_csv(out_csv, index=False)
-    canopy_df = remap(df, contract)
+    # Save normalized TreeSum (contract columns only, see ignored_columns) and remapped Canopy version
+    date_fmt = date_output_format(contract)
     canopy_csv = f"{outprefix}_canopy_treelevel.csv"
-    canopy_df.to_csv(canopy_csv, index=False)
-    with open(out_json, "w") as f:
-        json.dump(report, f, indent=2)
-    print(json.dumps(report, indent=2))
+    try:
+        table = arrow_table(df, date_fmt)
+        outputs, write = [(table, out_csv), (canopy_table(table, contract), canopy_csv)], write_table
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Frames Arrow can't type (odd mixed object columns) go through pandas instead
+        outputs = [(df, out_csv), (remap(df, contract), canopy_csv)]
+        write = lambda frame, path: frame.to_csv(path, index=False, date_format=date_fmt)
+    # The two CSVs are independent and Arrow releases the GIL while writing, so they overlap
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        writes = [ex.submit(write, frame, path) for frame, path in outputs]
+        for w in writes:
+            w.result()
+    # Encoded once; the same bytes go to the file and (decoded) to stdout, which the web app captures as text
+    blob = json_dumps_indent(report)
+    with open(out_json, "wb") as f:
+        f.write(blob)
+    print(blob.decode("utf-8"))
     print(f"Saved: {out_csv}, {canopy_csv}, {out_json}")
+    return report
+
+def main():
+    if len(sys.argv) < 4:
+        print("Usage: python validator.py <TreeSum.xlsx|.csv|.parquet> <contract.json> <output_prefix>")
+        sys.exit(1)
+    infile, contract_path, outprefix = sys.argv[1], sys.argv[2], sys.argv[3]
+    import_treesum(infile, load_contract(contract_path), outprefix)
 
 if __name__ == "__main__":
     main()
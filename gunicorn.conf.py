@@ -1,2 +1,7 @@
+import os
+
 bind='0.0.0.0:8000'
-workers=2
+workers=int(os.environ.get("CANOPY_WORKERS", "2"))
+# Import the app (pandas/numpy/matplotlib and the pipeline) once in the master;
+# workers fork already warm and share those pages copy-on-write
+preload_app=True